@@ -1,9 +1,17 @@
 import requests
+import orjson
+import msgspec
+from typing import List, Optional, Union
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sqlite3
 import time
-import gzip
 import os
-from datetime import datetime, date, timedelta, time as time_obj
+import sys
+import queue
+import threading
+import zstandard as zstd
+from datetime import datetime, timedelta, time as time_obj
 from enum import Enum
 
 # --- Configuration ---
@@ -17,12 +25,75 @@ SIM_DB_FILE = "simulation_data.db"
 
 SENSIBULL_URL = "https://oxide.sensibull.com/v1/compute/verified_by_sensibull/live_positions/snapshot/oculated-toy"
 HEADERS = {"accept": "application/json, text/plain, */*"}
+IS_TTY = sys.stdout.isatty()
 FETCH_INTERVAL_SECONDS = 15
+SNAPSHOT_FLUSH_EVERY = 4  # Snapshots buffered per commit; a crash loses at most this many polls
+WRITE_QUEUE_SIZE = 64  # Fetched bodies waiting for the DB writer thread
+WRITER_STOP_TIMEOUT_SECONDS = 30  # How long shutdown waits for the DB writer to flush and exit
 
 UPSTOX_API_URL = "https://api.upstox.com/v2/market/timings"
 UPSTOX_HEADERS = {'Accept': 'application/json'}
 COMPRESSION_HOUR = 16
 SAFE_API_CHECK_HOUR = 9
+ARCHIVE_COMPRESSION_LEVEL = 1  # Mostly numeric pages; higher zstd levels cost CPU for little size gain
+
+# Applied on every connection: journal_mode persists in the file, the rest are per-connection.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=10737418240",
+    "PRAGMA busy_timeout=3000",
+)
+
+# Sensibull instrument_type -> stored option type; anything else is stored as-is.
+_TYPE_MAP = {'CALL': 'CE', 'PUT': 'PE'}
+
+# Kept as constants so every call hits the connection's prepared-statement cache.
+SQL_INSERT_SNAPSHOT = "INSERT INTO snapshots (timestamp, total_pnl) VALUES (?, ?)"
+SQL_INSERT_DETAIL = "INSERT INTO position_details (snapshot_id, instrument_id, quantity, avg_price, last_price, unbooked_pnl, booked_pnl, underlying_price) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Shared session so the TLS connections to Sensibull/Upstox are kept alive between polls.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=Retry(total=2, backoff_factor=0.3)))
+
+# --- Sensibull Payload Schema ---
+# Only the fields we store; unknown keys are ignored and numeric strings are coerced (strict=False).
+
+class InstrumentInfo(msgspec.Struct):
+    instrument_type: Optional[str] = None
+    strike: Optional[float] = None
+    expiry: Optional[str] = None
+
+class Trade(msgspec.Struct):
+    trading_symbol: Optional[str] = None
+    quantity: Optional[Union[int, float]] = None  # Stored as sent; the column's INTEGER affinity normalises whole floats
+    average_price: Optional[float] = None
+    last_price: Optional[float] = None
+    unbooked_pnl: Optional[float] = None
+    booked_profit_loss: Optional[float] = None
+    instrument_info: Optional[InstrumentInfo] = None
+
+class PositionGroup(msgspec.Struct):
+    trading_symbol: Optional[str] = None
+    underlying_price: Optional[float] = None
+    trades: List[Trade] = []
+
+class PositionSnapshotData(msgspec.Struct):
+    created_at: Optional[str] = None
+    total_profit: Optional[float] = None
+    data: List[PositionGroup] = []
+
+class Payload(msgspec.Struct):
+    position_snapshot_data: Optional[PositionSnapshotData] = None
+
+class SnapshotResponse(msgspec.Struct):
+    success: bool = False
+    payload: Optional[Payload] = None
+
+SNAPSHOT_DECODER = msgspec.json.Decoder(SnapshotResponse, strict=False)
+_NO_INSTRUMENT_INFO = InstrumentInfo()
 
 # --- State Management ---
 class State(Enum):
@@ -34,12 +105,25 @@ class State(Enum):
 
 # --- Helper Functions ---
 
+def clock():
+    # Single libc call; used for every log prefix instead of datetime.now().strftime().
+    return time.strftime('%H:%M:%S')
+
+_last_status = None
+
+def status(text):
+    # Live-updating line on a terminal; under a pipe or log file, only log when the text changes.
+    global _last_status
+    if IS_TTY: print(f"[{clock()}] {text}", end='\r')
+    elif text != _last_status: print(f"[{clock()}] {text}")
+    _last_status = text
+
 def get_market_timings_for_date(check_date):
     try:
         url = f"{UPSTOX_API_URL}/{check_date.strftime('%Y-%m-%d')}"
-        response = requests.get(url, headers=UPSTOX_HEADERS, timeout=10)
+        response = SESSION.get(url, headers=UPSTOX_HEADERS, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         timings_list = data.get('data', [])
         for exchange_data in timings_list:
             if exchange_data.get('exchange') == 'NSE':
@@ -58,60 +142,159 @@ def get_db_filename_for_date(d):
 
 def compress_db_file(db_file):
     if not os.path.exists(db_file): return
-    compressed_file = f"{db_file}.gz"
+    compressed_file = f"{db_file}.zst"
+    compact_file = f"{db_file}.compact"
     try:
-        with open(db_file, 'rb') as f_in:
-            with gzip.open(compressed_file, 'wb') as f_out: f_out.writelines(f_in)
-        os.remove(db_file)
+        # Fold the WAL back in and write a defragmented single-file copy to compress.
+        if os.path.exists(compact_file): os.remove(compact_file)
+        con = sqlite3.connect(db_file)
+        try:
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            con.execute("VACUUM INTO ?", (compact_file,))
+        finally: con.close()
+        cctx = zstd.ZstdCompressor(level=ARCHIVE_COMPRESSION_LEVEL, threads=-1)
+        with open(compact_file, 'rb') as f_in, open(compressed_file, 'wb') as f_out:
+            cctx.copy_stream(f_in, f_out, size=os.path.getsize(compact_file))
+        for path in (compact_file, db_file, f"{db_file}-wal", f"{db_file}-shm"):
+            if os.path.exists(path): os.remove(path)
         print(f"[SUCCESS] Compressed {db_file} to {compressed_file}")
     except Exception as e: print(f"[ERROR] Failed to compress {db_file}: {e}")
 
+def perform_post_market_tasks(trading_day):
+    if trading_day: compress_db_file(get_db_filename_for_date(trading_day))
+
+def _connect(db_file):
+    con = sqlite3.connect(db_file, isolation_level=None)  # Transactions are managed explicitly
+    for pragma in SQLITE_PRAGMAS: con.execute(pragma)
+    return con
+
 def setup_database(db_file):
-    with sqlite3.connect(db_file) as con:
+    with _connect(db_file) as con:
         cur = con.cursor()
         cur.execute("CREATE TABLE IF NOT EXISTS instruments (id INTEGER PRIMARY KEY, symbol TEXT UNIQUE NOT NULL, underlying_symbol TEXT, type TEXT, strike REAL, expiry TEXT)")
         cur.execute("CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, total_pnl REAL)")
         cur.execute("CREATE TABLE IF NOT EXISTS position_details (snapshot_id INTEGER, instrument_id INTEGER, quantity INTEGER, avg_price REAL, last_price REAL, unbooked_pnl REAL, booked_pnl REAL, underlying_price REAL, FOREIGN KEY (snapshot_id) REFERENCES snapshots (id), FOREIGN KEY (instrument_id) REFERENCES instruments (id))")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pd_snap_instr ON position_details (snapshot_id, instrument_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_snap_ts ON snapshots (timestamp)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pd_instrument ON position_details (instrument_id)")
     print(f"Database setup/check complete for {db_file}.")
 
-def insert_positions_data(db_file, payload, instrument_cache):
-    snapshot_data = payload.get('position_snapshot_data')
-    if not snapshot_data or not snapshot_data.get('data'): return 0
-    with sqlite3.connect(db_file) as con:
-        cur = con.cursor()
-        cur.execute("INSERT INTO snapshots (timestamp, total_pnl) VALUES (?, ?)", (snapshot_data.get('created_at'), snapshot_data.get('total_profit')))
-        snapshot_id = cur.lastrowid
-        rows_inserted = 0
-        for position_group in snapshot_data.get('data', []):
-            underlying_symbol = position_group.get('trading_symbol')
-            underlying_price = position_group.get('underlying_price')
-            for trade in position_group.get('trades', []):
-                instrument_symbol = trade.get('trading_symbol')
-                if instrument_symbol not in instrument_cache:
-                    info = trade.get('instrument_info', {})
-                    cur.execute("INSERT OR IGNORE INTO instruments (symbol, underlying_symbol, type, strike, expiry) VALUES (?, ?, ?, ?, ?)", (instrument_symbol, underlying_symbol, 'CE' if info.get('instrument_type') == 'CALL' else 'PE' if info.get('instrument_type') == 'PUT' else info.get('instrument_type'), info.get('strike'), info.get('expiry')))
-                    cur.execute("SELECT id FROM instruments WHERE symbol = ?", (instrument_symbol,))
-                    instrument_id_tuple = cur.fetchone()
-                    if instrument_id_tuple: instrument_cache[instrument_symbol] = instrument_id_tuple[0]
-                    else: print(f"\n[ERROR] Could not retrieve instrument ID for {instrument_symbol}."); continue
-                instrument_id = instrument_cache[instrument_symbol]
-                cur.execute("INSERT INTO position_details (snapshot_id, instrument_id, quantity, avg_price, last_price, unbooked_pnl, booked_pnl, underlying_price) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (snapshot_id, instrument_id, trade.get('quantity'), trade.get('average_price'), trade.get('last_price'), trade.get('unbooked_pnl'), trade.get('booked_profit_loss'), underlying_price))
-                rows_inserted += 1
-        return rows_inserted
-
-def fetch_and_store_data(db_file, instrument_cache):
+def insert_positions_data(con, payloads, instrument_cache):
+    snapshots = [payload.position_snapshot_data for payload in payloads
+                 if payload.position_snapshot_data is not None and payload.position_snapshot_data.data]
+    if not snapshots: return 0
+    # Take the write lock up front rather than upgrading a deferred transaction mid-way.
+    con.execute("BEGIN IMMEDIATE")
     try:
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Fetching data... ", end='')
-        response = requests.get(SENSIBULL_URL, headers=HEADERS, timeout=10)
+        new_instruments = {}
+        for snapshot_data in snapshots:
+            for position_group in snapshot_data.data:
+                for trade in position_group.trades:
+                    instrument_symbol = trade.trading_symbol
+                    if instrument_symbol is not None and instrument_symbol not in instrument_cache and instrument_symbol not in new_instruments:
+                        info = trade.instrument_info or _NO_INSTRUMENT_INFO  # Missing or null: store the symbol without details
+                        new_instruments[instrument_symbol] = (instrument_symbol, position_group.trading_symbol, _TYPE_MAP.get(info.instrument_type, info.instrument_type), info.strike, info.expiry)
+        new_instrument_ids = {}
+        if new_instruments:
+            # One upsert for all unseen symbols; RETURNING yields ids for both new and existing rows.
+            values = ", ".join(["(?, ?, ?, ?, ?)"] * len(new_instruments))
+            params = [value for row in new_instruments.values() for value in row]
+            new_instrument_ids.update(con.execute(f"INSERT INTO instruments (symbol, underlying_symbol, type, strike, expiry) VALUES {values} ON CONFLICT(symbol) DO UPDATE SET symbol = excluded.symbol RETURNING symbol, id", params).fetchall())
+
+        details = []
+        for snapshot_data in snapshots:
+            snapshot_id = con.execute(SQL_INSERT_SNAPSHOT, (snapshot_data.created_at, snapshot_data.total_profit)).lastrowid
+            for position_group in snapshot_data.data:
+                underlying_price = position_group.underlying_price
+                for trade in position_group.trades:
+                    instrument_id = instrument_cache.get(trade.trading_symbol) or new_instrument_ids.get(trade.trading_symbol)
+                    if instrument_id is None: print(f"[ERROR] Could not retrieve instrument ID for {trade.trading_symbol}."); continue
+                    details.append((snapshot_id, instrument_id, trade.quantity, trade.average_price, trade.last_price, trade.unbooked_pnl, trade.booked_profit_loss, underlying_price))
+        con.executemany(SQL_INSERT_DETAIL, details)
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    # Only cache ids once they are committed; a rollback would otherwise leave dangling ids behind.
+    instrument_cache.update(new_instrument_ids)
+    return len(details)
+
+def flush_pending_snapshots(con, pending_snapshots, instrument_cache):
+    if not pending_snapshots: return
+    try:
+        rows = insert_positions_data(con, pending_snapshots, instrument_cache)
+        print(f"[{clock()}] Flushed {len(pending_snapshots)} snapshots ({rows} rows).")
+    except Exception as e:
+        print(f"[ERROR] Failed to write {len(pending_snapshots)} buffered snapshots: {e}")
+    finally:
+        pending_snapshots.clear()
+
+def db_writer_loop(db_file, write_queue):
+    # Owns the session's SQLite connection; the fetch loop only hands it raw response bodies.
+    con = _connect(db_file)
+    pending_snapshots = []
+    try:
+        # Pre-warm from the DB so a mid-day restart does not re-upsert every known symbol.
+        instrument_cache = dict(con.execute("SELECT symbol, id FROM instruments").fetchall())
+        while True:
+            body = write_queue.get()
+            if body is not None:
+                try:
+                    response = SNAPSHOT_DECODER.decode(body)
+                    if response.success and response.payload is not None: pending_snapshots.append(response.payload)
+                    else: print(f"[{clock()}] API call not successful or payload missing.")
+                except Exception as e: print(f"[ERROR] Could not decode fetched snapshot: {e}")
+            if body is None or len(pending_snapshots) >= SNAPSHOT_FLUSH_EVERY:
+                flush_pending_snapshots(con, pending_snapshots, instrument_cache)
+            if body is None: return
+    finally:
+        con.close()
+
+def run_db_writer(db_file, write_queue):
+    # Thread target: a failure would otherwise only surface as an unhandled-thread traceback.
+    try: db_writer_loop(db_file, write_queue)
+    except Exception as e: print(f"[ERROR] DB writer stopped: {e}")
+
+def start_db_writer(db_file, write_queue=None):
+    if write_queue is None: write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer = threading.Thread(target=run_db_writer, args=(db_file, write_queue), name="db-writer", daemon=True)
+    writer.start()
+    return write_queue, writer
+
+def ensure_db_writer(db_writer, db_file):
+    write_queue, writer = db_writer
+    if writer.is_alive(): return db_writer
+    print(f"[ERROR] DB writer is not running; restarting it for {db_file}.")
+    return start_db_writer(db_file, write_queue)  # Same queue, so bodies already handed over are kept
+
+def stop_db_writer(db_writer):
+    write_queue, writer = db_writer
+    if not writer.is_alive():
+        print(f"[ERROR] DB writer had already stopped; {write_queue.qsize()} queued snapshots were not written.")
+        return
+    try: write_queue.put(None, timeout=WRITER_STOP_TIMEOUT_SECONDS)  # Sentinel: flush whatever is buffered and close the connection
+    except queue.Full: print("[ERROR] DB writer did not accept the stop signal; queued snapshots may be lost."); return
+    writer.join(timeout=WRITER_STOP_TIMEOUT_SECONDS)
+    if writer.is_alive(): print(f"[ERROR] DB writer did not finish within {WRITER_STOP_TIMEOUT_SECONDS}s.")
+
+def fetch_and_store_data(write_queue):
+    try:
+        response = SESSION.get(SENSIBULL_URL, headers=HEADERS, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        if data.get('success') and 'payload' in data:
-            rows = insert_positions_data(db_file, data['payload'], instrument_cache)
-            print(f"Success! Inserted {rows} rows.")
-        else:
-            print("API call not successful or payload missing.")
+        write_queue.put(response.content, timeout=FETCH_INTERVAL_SECONDS)
+        print(f"[{clock()}] Fetched snapshot ({len(response.content)} bytes).")
+    except queue.Full:
+        print("[ERROR] DB writer is falling behind; dropped the fetched snapshot.")
     except Exception as e:
-        print(f"\n[ERROR] An error occurred during fetch: {e}")
+        print(f"[ERROR] An error occurred during fetch: {e}")
+
+def sleep_until(target):
+    # One long sleep instead of a polling loop; loops only if the sleep returns early.
+    while (remaining := (target - datetime.now()).total_seconds()) > 0:
+        time.sleep(remaining)
+
+def sleep_until_next_poll(poll_started):
+    time.sleep(max(0.0, FETCH_INTERVAL_SECONDS - (time.monotonic() - poll_started)))
 
 def run_simulation_mode():
     print("="*50 + "\n===      RUNNING IN SIMULATION MODE      ===\n" + "="*50)
@@ -120,7 +303,7 @@ def run_simulation_mode():
     if os.path.exists(sim_db_path): os.remove(sim_db_path)
     
     setup_database(sim_db_path)
-    instrument_cache = {}
+    db_writer = start_db_writer(sim_db_path)
     
     start_time = datetime.now() + timedelta(seconds=SIM_MARKET_OPEN_IN_SECONDS)
     close_time = start_time + timedelta(seconds=SIM_MARKET_DURATION_SECONDS)
@@ -129,23 +312,26 @@ def run_simulation_mode():
     print(f"Simulation will run:\n  - Market Open:   {start_time.strftime('%H:%M:%S')}\n  - Market Close:  {close_time.strftime('%H:%M:%S')}\n  - Compression:   {compress_time.strftime('%H:%M:%S')}")
     
     while datetime.now() < start_time:
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Simulation waiting to start...", end='\r')
+        status("Simulation waiting to start...")
         time.sleep(1)
     
-    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] SIM: Market is OPEN.")
+    print(f"\n[{clock()}] SIM: Market is OPEN.")
     while datetime.now() < close_time:
-        fetch_and_store_data(sim_db_path, instrument_cache)
-        time.sleep(FETCH_INTERVAL_SECONDS)
+        poll_started = time.monotonic()
+        db_writer = ensure_db_writer(db_writer, sim_db_path)
+        fetch_and_store_data(db_writer[0])
+        sleep_until_next_poll(poll_started)
         
-    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] SIM: Market is CLOSED.")
+    stop_db_writer(db_writer)
+    print(f"\n[{clock()}] SIM: Market is CLOSED.")
     
     while datetime.now() < compress_time:
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Simulation waiting for compression time...", end='\r')
+        status("Simulation waiting for compression time...")
         time.sleep(1)
         
-    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] SIM: Performing post-market tasks.")
+    print(f"\n[{clock()}] SIM: Performing post-market tasks.")
     compress_db_file(sim_db_path)
-    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Simulation cycle complete.")
+    print(f"\n[{clock()}] Simulation cycle complete.")
 
 # --- Main Autonomous Loop ---
 
@@ -159,7 +345,7 @@ def main():
     print("--- Autonomous Data Capture Script (Polling Mode): Starting Up ---")
     current_state = State.INITIALIZING
     current_db_file = None
-    instrument_cache = {}
+    current_db_writer = None
     market_timings_today = None
     last_checked_date = None
     
@@ -179,11 +365,14 @@ def main():
                 last_checked_date = today
                 current_state = State.INITIALIZING
                 
-                while datetime.now().hour < SAFE_API_CHECK_HOUR:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Pre-market sleep. Waiting for {SAFE_API_CHECK_HOUR}:00...", end='\r')
-                    time.sleep(30)
+                safe_check_time = datetime.combine(today, time_obj(SAFE_API_CHECK_HOUR, 0))
+                if now < safe_check_time:
+                    status(f"Pre-market sleep. Waiting for {SAFE_API_CHECK_HOUR}:00...")
+                    sleep_until(safe_check_time)
+                    now = datetime.now()
+                    current_time = now.time()
 
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Safe hour reached. Checking market status...")
+                print(f"\n[{clock()}] Safe hour reached. Checking market status...")
                 market_timings_today = get_market_timings_for_date(today)
 
                 if market_timings_today:
@@ -207,40 +396,44 @@ def main():
                     current_state = State.SLEEPING
             
             if current_state == State.WAITING_FOR_MARKET_OPEN:
-                print(f"[{current_time.strftime('%H:%M:%S')}] Waiting for market to open at {market_open.strftime('%H:%M')}...", end='\r')
+                status(f"Waiting for market to open at {market_open.strftime('%H:%M')}...")
                 if datetime.now().time() >= market_open:
-                    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Market is OPEN.")
+                    print(f"\n[{clock()}] Market is OPEN.")
                     current_state = State.CAPTURING_DATA
                 else:
                     time.sleep(1)
 
             elif current_state == State.CAPTURING_DATA:
-                if current_db_file is None: # Just-in-time setup on first capture
+                if current_db_writer is None: # Just-in-time setup on first capture
                     current_db_file = get_db_filename_for_date(today)
-                    instrument_cache = {}
                     setup_database(current_db_file)
+                    current_db_writer = start_db_writer(current_db_file)
                 
                 if datetime.now().time() < market_close:
-                    fetch_and_store_data(current_db_file, instrument_cache)
-                    time.sleep(FETCH_INTERVAL_SECONDS)
+                    poll_started = time.monotonic()
+                    current_db_writer = ensure_db_writer(current_db_writer, current_db_file)
+                    fetch_and_store_data(current_db_writer[0])
+                    sleep_until_next_poll(poll_started)
                 else:
-                    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Market is CLOSED.")
+                    print(f"\n[{clock()}] Market is CLOSED.")
+                    stop_db_writer(current_db_writer)
+                    current_db_writer = None
                     current_state = State.POST_MARKET_TASKS
 
             elif current_state == State.POST_MARKET_TASKS:
                 print(f"[{current_time.strftime('%H:%M:%S')}] Performing post-market tasks.")
-                if last_trading_day_for_compression:
-                    db_to_compress = get_db_filename_for_date(last_trading_day_for_compression)
-                    compress_db_file(db_to_compress)
+                perform_post_market_tasks(last_trading_day_for_compression)
                 print("Post-market tasks complete. Switching to sleep mode.")
                 current_state = State.SLEEPING
             
             elif current_state == State.SLEEPING:
-                print(f"[{current_time.strftime('%H:%M:%S')}] Main thread status: {current_state.name}. Sleeping...", end='\r')
-                time.sleep(60)
+                status(f"Main thread status: {current_state.name}. Sleeping until the next day...")
+                sleep_until(datetime.combine(today + timedelta(days=1), time_obj.min))
 
     except (KeyboardInterrupt, SystemExit):
         print("\n--- Shutting down script ---")
+    finally:
+        if current_db_writer is not None: stop_db_writer(current_db_writer)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
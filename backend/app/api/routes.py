@@ -1,50 +1,98 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import io
 import logging
+import msgspec
 
+from ..core.config import settings
 from ..services.data_service import DataService
-from ..models.schemas import (
-    TradingDaysResponse, TradingDayData, DaySummary, 
-    APIResponse, AvailableFiltersResponse
-)
+from ..models.schemas import APIResponse
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 data_service = DataService()
 
+def _encode_model(obj: Any) -> Any:
+    """msgspec fallback for the pydantic models (summaries, filters) nested in response data"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+_encoder = msgspec.json.Encoder(enc_hook=_encode_model)
+
+def _render(data: Any, message: str) -> bytes:
+    """Serialize an APIResponse envelope straight to JSON bytes"""
+    return _encoder.encode({"success": True, "data": data, "message": message, "error": None})
+
+def _stream_render(data: Dict[str, Any], message: str) -> Iterator[bytes]:
+    """Yield the same bytes as _render, encoding the timeseries a chunk of snapshots at a time"""
+    yield b'{"success":true,"data":{'
+    for i, (name, value) in enumerate(data.items()):
+        yield (b',' if i else b'') + _encoder.encode(name) + b':'
+        if name != "timeseries":
+            yield _encoder.encode(value)
+            continue
+        yield b'['
+        for start in range(0, len(value), settings.STREAM_CHUNK_SNAPSHOTS):
+            # Encode a slice as a JSON array and drop its brackets to splice it into the outer one
+            chunk = _encoder.encode(value[start:start + settings.STREAM_CHUNK_SNAPSHOTS])[1:-1]
+            yield (b',' if start else b'') + chunk
+        yield b']'
+    yield b'},"message":' + _encoder.encode(message) + b',"error":null}'
+
+def _teed(chunks: Iterator[bytes], on_complete: Callable[[bytes], None]) -> Iterator[bytes]:
+    """Pass chunks through, handing the whole body to on_complete once fully sent.
+
+    Chunks are appended to one growing buffer whose getvalue() hands over its bytes without a
+    copy, so the body is held once (for the cache) rather than as chunks plus a joined copy.
+    """
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+        yield chunk
+    on_complete(buffer.getvalue())
+
+def _json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+def _cached_response(request: Request, rendered: Tuple[bytes, str]) -> Response:
+    """Serve a cached body with its ETag, or 304 when the client already holds this version"""
+    body, etag = rendered
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def _filters_key(filters: Optional[List[str]]) -> tuple:
+    return tuple(sorted(filters or ()))
+
 @router.get("/trading-days", response_model=APIResponse)
 async def get_trading_days():
     """Get all available trading days"""
     try:
-        available_dates = data_service.get_available_trading_days()
-        response_data = TradingDaysResponse(
-            available_dates=available_dates,
-            total_days=len(available_dates)
-        )
-        return APIResponse(
-            success=True,
-            data=response_data.dict(),
-            message=f"Found {len(available_dates)} trading days"
-        )
+        available_dates = await run_in_threadpool(data_service.get_available_trading_days)
+        response_data = {"available_dates": available_dates, "total_days": len(available_dates)}
+        return _json_response(_render(response_data, f"Found {len(available_dates)} trading days"))
     except Exception as e:
         logger.error(f"Error getting trading days: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving trading days: {str(e)}")
 
 @router.get("/data/{date}/filters", response_model=APIResponse)
-async def get_day_filters(date: str):
+async def get_day_filters(date: str, request: Request):
     """Get available underlying/expiry filters for a given trading day"""
     try:
-        filters = data_service.get_available_filters(date)
-        if filters is None:
+        def render() -> Optional[bytes]:
+            filters = data_service.get_available_filters(date)
+            if filters is None: return None
+            return _render({"filters": filters}, f"Found {len(filters)} filter options for {date}")
+
+        rendered = await run_in_threadpool(data_service.get_rendered, ("filters", date), date, render)
+        if rendered is None:
              raise HTTPException(status_code=404, detail=f"No data found for date: {date}")
-        
-        response_data = AvailableFiltersResponse(filters=filters)
-        return APIResponse(
-            success=True,
-            data=response_data.dict(),
-            message=f"Found {len(filters)} filter options for {date}"
-        )
+        return _cached_response(request, rendered)
     except HTTPException:
         raise
     except Exception as e:
@@ -52,8 +100,12 @@ async def get_day_filters(date: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving filters for {date}: {str(e)}")
 
 @router.get("/data/{date}", response_model=APIResponse)
-async def get_trading_day_data(date: str, filters: Optional[List[str]] = Query(None)):
-    """Get complete trading day data, with optional filtering"""
+async def get_trading_day_data(
+    date: str, request: Request, filters: Optional[List[str]] = Query(None),
+    page_limit: Optional[int] = Query(None, ge=1, le=settings.MAX_PAGE_LIMIT),
+    page_offset: int = Query(0, ge=0)
+):
+    """Get complete trading day data, with optional filtering and timeseries pagination"""
     try:
         from datetime import datetime
         try:
@@ -61,14 +113,25 @@ async def get_trading_day_data(date: str, filters: Optional[List[str]] = Query(N
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
         
-        data = data_service.get_trading_day_data(date, filters)
+        page = None if page_limit is None else (page_offset, page_limit)
+        key = ("data", date, _filters_key(filters), page)
+        rendered = data_service.get_cached_rendered(key, date)
+        if rendered is not None:
+            return _cached_response(request, rendered)
+
+        if page_limit is None:
+            data = await run_in_threadpool(data_service.get_trading_day_data, date, filters)
+        else:
+            data = await run_in_threadpool(data_service.get_trading_day_page, date, filters, page_offset, page_limit)
         if data is None:
             raise HTTPException(status_code=404, detail=f"No data found for date: {date}")
-        
-        return APIResponse(
-            success=True, data=data,
-            message=f"Successfully retrieved data for {date}"
-        )
+
+        # Stream the first render so bytes go out while later snapshots are still being encoded;
+        # the body is only collected when there is a response cache to keep it in
+        chunks = _stream_render(data, f"Successfully retrieved data for {date}")
+        if settings.MAX_RESPONSE_CACHE_ENTRIES > 0:
+            chunks = _teed(chunks, lambda body: data_service.store_rendered(key, date, body))
+        return StreamingResponse(chunks, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -76,7 +139,7 @@ async def get_trading_day_data(date: str, filters: Optional[List[str]] = Query(N
         raise HTTPException(status_code=500, detail=f"Error retrieving data for {date}: {str(e)}")
 
 @router.get("/data/{date}/summary", response_model=APIResponse)
-async def get_day_summary(date: str, filters: Optional[List[str]] = Query(None)):
+async def get_day_summary(date: str, request: Request, filters: Optional[List[str]] = Query(None)):
     """Get summary data for a trading day, with optional filtering"""
     try:
         from datetime import datetime
@@ -85,30 +148,47 @@ async def get_day_summary(date: str, filters: Optional[List[str]] = Query(None))
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
         
-        summary = data_service.get_day_summary_only(date, filters)
-        if summary is None:
+        def render() -> Optional[bytes]:
+            summary = data_service.get_day_summary_only(date, filters)
+            if summary is None: return None
+            return _render(summary, f"Successfully retrieved summary for {date}")
+
+        rendered = await run_in_threadpool(data_service.get_rendered, ("summary", date, _filters_key(filters)), date, render)
+        if rendered is None:
             raise HTTPException(status_code=404, detail=f"No data found for date: {date}")
-        
-        return APIResponse(
-            success=True, data=summary.dict(),
-            message=f"Successfully retrieved summary for {date}"
-        )
+        return _cached_response(request, rendered)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error getting summary for {date}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving summary for {date}: {str(e)}")
 
+@router.get("/summaries", response_model=APIResponse)
+async def get_day_summaries(dates: List[str] = Query(...), filters: Optional[List[str]] = Query(None)):
+    """Get summaries for several trading days in one request; days without data map to null"""
+    try:
+        from datetime import datetime
+        try:
+            for date in dates:
+                datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+        summaries = await run_in_threadpool(data_service.get_multi_day_summaries, list(dict.fromkeys(dates)), filters)
+        found = sum(1 for summary in summaries.values() if summary is not None)
+        return _json_response(_render({"summaries": summaries}, f"Retrieved summaries for {found} of {len(summaries)} days"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting summaries for {dates}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving summaries: {str(e)}")
+
 @router.post("/refresh-cache")
 async def refresh_cache():
     """Clear all cached data to force fresh reload"""
     try:
         data_service.clear_cache()
-        return APIResponse(
-            success=True,
-            message="Cache cleared successfully",
-            data={"cache_cleared": True}
-        )
+        return _json_response(_render({"cache_cleared": True}, "Cache cleared successfully"))
     except Exception as e:
         logger.error(f"Error clearing cache: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}")
@@ -116,12 +196,9 @@ async def refresh_cache():
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return APIResponse(
-        success=True,
-        message="Trading Dashboard API is running",
-        data={
-            "status": "healthy",
-            "data_folder": str(data_service.data_folder),
-            "available_days": len(data_service.get_available_trading_days())
-        }
-    )
\ No newline at end of file
+    available_dates = await run_in_threadpool(data_service.get_available_trading_days)
+    return _json_response(_render({
+        "status": "healthy",
+        "data_folder": str(data_service.data_folder),
+        "available_days": len(available_dates)
+    }, "Trading Dashboard API is running"))
\ No newline at end of file
@@ -14,11 +14,24 @@ class Settings:
     # Database settings
     DB_PREFIX = "data-"
     DB_EXTENSION = ".db"
-    COMPRESSED_EXTENSION = ".gz"
+    COMPRESSED_EXTENSION = ".zst"
+    INSTRUMENTS_CACHE_PREFIX = "instruments-"  # Pickled per-day instruments next to the archives
+    MARKERS_DB_PREFIX = "markers-"  # Sidecar databases of precomputed trade markers
+    LEGACY_COMPRESSED_EXTENSION = ".gz"  # Archives written before the switch to zstd
     
     # Performance settings
     BATCH_SIZE = 1000
     MAX_WORKERS = 4
+    TODAY_CACHE_TTL_SECONDS = 30  # Cached responses for the day still being captured
+    MAX_RESPONSE_CACHE_ENTRIES = 32  # Cached responses kept (0 disables); least recently used are evicted
+    MAX_MATERIALIZED_DBS = 8  # Decompressed archive images kept in memory for reuse
+    MAX_MATERIALIZED_BYTES = 1 << 30  # Total size of those images; least recently used are dropped first
+    DB_POOL_SIZE = 4  # Idle read-only connections kept per database file
+    MAX_POOLED_DBS = 8  # Databases with a connection pool; least recently used pools are closed
+    WARM_CACHE_DAYS = 5  # Most recent trading days loaded into the cache at startup
+    MAX_PAGE_LIMIT = 5000  # Largest timeseries page a client may request
+    STREAM_CHUNK_SNAPSHOTS = 256  # Snapshots encoded per chunk when streaming a day's timeseries
+    THREADPOOL_SIZE = 32  # Worker threads for blocking data loads off the event loop
     
     # CORS settings
     ALLOWED_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
@@ -1,10 +1,15 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import anyio.to_thread
+import asyncio
 import logging
 
 from .core.config import settings
 from .api import api_router
+from .api.routes import data_service
 
 # Configure logging
 logging.basicConfig(
@@ -13,8 +18,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Data loads run in anyio's worker threads; widen the pool so concurrent requests overlap
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    # Warm recent days in the background so the first dashboard load is served from cache
+    warmup = asyncio.create_task(run_in_threadpool(data_service.warm_cache))
+    yield
+    if not warmup.done():
+        warmup.cancel()
+
 def create_app() -> FastAPI:
     app = FastAPI(
+        lifespan=lifespan,
         title=settings.PROJECT_NAME,
         version=settings.VERSION,
         description="FastAPI backend for Trading Dashboard",
@@ -1,3 +1,4 @@
+import msgspec
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -8,7 +9,9 @@ class TradeMarkerType(str, Enum):
     SQUARE_UP = "square_up"
     NONE = "none"
 
-class InstrumentInfo(BaseModel):
+# Data-plane models are msgspec Structs: built per row and encoded straight to JSON in C.
+# They do no validation, so only construct them from trusted database rows.
+class InstrumentInfo(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     id: int
     symbol: str
     underlying_symbol: str
@@ -16,7 +19,7 @@ class InstrumentInfo(BaseModel):
     strike: Optional[float] = None
     expiry: Optional[str] = None
 
-class PositionDetail(BaseModel):
+class PositionDetail(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     instrument_id: int
     instrument: InstrumentInfo
     quantity: int
@@ -26,7 +29,7 @@ class PositionDetail(BaseModel):
     booked_pnl: float
     underlying_price: float
 
-class PositionChange(BaseModel):
+class PositionChange(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     instrument_id: int
     instrument_symbol: str
     instrument: Optional[InstrumentInfo] = None  # Include full instrument details
@@ -36,12 +39,13 @@ class PositionChange(BaseModel):
     old_price: Optional[float] = None
     new_price: Optional[float] = None
 
-class TradeMarker(BaseModel):
+class TradeMarker(msgspec.Struct, kw_only=True, frozen=True, gc=False):
     type: TradeMarkerType
     changes: List[PositionChange]
     summary: str
 
-class SnapshotData(BaseModel):
+# Not frozen: TradeAnalyzer attaches trade_marker after loading
+class SnapshotData(msgspec.Struct, kw_only=True, gc=False):
     timestamp: datetime
     total_pnl: float
     underlying_price: Optional[float] = None
@@ -60,7 +64,7 @@ class DaySummary(BaseModel):
     max_pnl: float
     underlying_range: Optional[Dict[str, float]] = None
 
-class TradingDayData(BaseModel):
+class TradingDayData(msgspec.Struct, kw_only=True, gc=False):
     date: str
     summary: DaySummary
     timeseries: List[SnapshotData]
@@ -1,53 +1,217 @@
 import sqlite3
 import gzip
-import pandas as pd
+import zlib
+import zstandard
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Set
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterator, List, Optional, Tuple
+from array import array
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime, date
 from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import itertools
 import logging
+import msgspec
+import orjson
+import os
+import pickle
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
 
 from ..core.config import settings
-from ..models.schemas import InstrumentInfo, PositionDetail, SnapshotData, DaySummary, FilterOption
+from ..models.schemas import (
+    InstrumentInfo, PositionDetail, SnapshotData, DaySummary, FilterOption,
+    PositionChange, TradeMarker, TradeMarkerType
+)
 
 logger = logging.getLogger(__name__)
 
+# Per-connection read tuning: memory-mapped I/O and a 64 MiB page cache
+READ_PRAGMAS = (
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA query_only=1",
+)
+
+# Archive images live in one shared in-memory store, so a big page cache per connection would only
+# duplicate it; reads from the store are plain memory copies
+IMAGE_READ_PRAGMAS = READ_PRAGMAS + ("PRAGMA cache_size=-2048",)
+
+# Names for the shared in-memory stores: a leading "/" makes a memdb database visible to every
+# connection in the process that opens the same URI
+_memdb_ids = itertools.count()
+
+# Lets the snapshot join walk both tables in index order instead of sorting
+READ_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_pd_snap_instr ON position_details(snapshot_id, instrument_id);
+    CREATE INDEX IF NOT EXISTS idx_snap_ts ON snapshots(timestamp);
+"""
+
+def _etag(body: bytes) -> str:
+    """Strong ETag for a rendered response body"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def _as_float(value) -> float:
+    """Convert a nullable REAL column, mapping NULL to NaN as pandas did"""
+    return float("nan") if value is None else float(value)
+
+# Day files are named <DB_PREFIX>YYYY-MM-DD<suffix>; the date is a fixed-width slice
+_DAY_FILE_SUFFIXES = (
+    f"{settings.DB_EXTENSION}{settings.COMPRESSED_EXTENSION}",
+    f"{settings.DB_EXTENSION}{settings.LEGACY_COMPRESSED_EXTENSION}",
+    settings.DB_EXTENSION,
+)
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# (underlying_symbol, expiry) -> ids of the instruments a filter key selects
+InstrumentIndex = Dict[Tuple[str, str], FrozenSet[int]]
+
+def _index_instruments(instruments: Dict[int, InstrumentInfo]) -> InstrumentIndex:
+    """Group instrument ids by (underlying, expiry); instruments missing either can't be filtered on"""
+    index = defaultdict(set)
+    for instrument_id, info in instruments.items():
+        if info.underlying_symbol and info.expiry is not None:
+            index[(info.underlying_symbol, info.expiry)].add(instrument_id)
+    return {key: frozenset(ids) for key, ids in index.items()}
+
+@lru_cache(maxsize=1)
+def _scan_trading_days(data_folder: Path, mtime_ns: int) -> Tuple[str, ...]:
+    """Trading days found in data_folder, newest first; mtime_ns only keys the cache"""
+    dates = set()  # Use set to avoid duplicates
+    prefix_len = len(settings.DB_PREFIX)
+    
+    # Look for both compressed and uncompressed files
+    with os.scandir(data_folder) as entries:
+        for entry in entries:
+            filename = entry.name
+            if not filename.startswith(settings.DB_PREFIX) or filename[prefix_len + 10:] not in _DAY_FILE_SUFFIXES:
+                continue
+            
+            date_part = filename[prefix_len:prefix_len + 10]
+            if not _DATE_PATTERN.fullmatch(date_part):
+                continue
+            try:
+                # The pattern only checks the shape; reject impossible dates like 2024-02-30
+                date.fromisoformat(date_part)
+            except ValueError:
+                continue
+            dates.add(date_part)  # Add to set (automatically deduplicates)
+    
+    return tuple(sorted(dates, reverse=True))
+
 class DataService:
     def __init__(self):
         self.data_folder = settings.DATA_FOLDER
-        self._instruments_cache: Dict[str, Dict[int, InstrumentInfo]] = {}
+        # Instruments per day, with the source version they were read from
+        self._instruments_cache: Dict[str, Tuple[Optional[Tuple[str, int]], Dict[int, InstrumentInfo], InstrumentIndex]] = {}
+        self._response_cache: "OrderedDict[Tuple, Tuple[Optional[float], Optional[Tuple[str, int]], Any]]" = OrderedDict()
+        # Archive path -> (mtime_ns, memdb URI, connection keeping the store alive, image size)
+        self._materialized_dbs: "OrderedDict[Path, Tuple[int, str, sqlite3.Connection, int]]" = OrderedDict()
+        # Routes run service calls on a threadpool, so shared caches are guarded
+        self._cache_lock = threading.Lock()
+        self._materialize_lock = threading.Lock()
+        self._materialize_path_locks: Dict[Path, threading.Lock] = {}
+        # Idle read-only connections, keyed by live file path or (archive path, mtime) image
+        self._pools: "OrderedDict[Hashable, queue.Queue[sqlite3.Connection]]" = OrderedDict()
+        self._pool_lock = threading.Lock()
     
     def clear_cache(self):
         """Clear all cached data - useful for refreshing data"""
-        self._instruments_cache.clear()
+        with self._cache_lock:
+            self._instruments_cache.clear()
+            self._response_cache.clear()
+        # The on-disk sidecars are caches too; a refresh rebuilds them from the day files
+        for pattern in (f"{settings.INSTRUMENTS_CACHE_PREFIX}*.pkl", f"{settings.MARKERS_DB_PREFIX}*.db"):
+            for sidecar in self.data_folder.glob(pattern):
+                sidecar.unlink(missing_ok=True)
+        with self._pool_lock:
+            pool_keys = list(self._pools)
+        for pool_key in pool_keys:
+            self._drop_pool(pool_key)
+
+    def _cached(self, key: Tuple, date_str: str, loader: Callable[[], Any]) -> Any:
+        """Return a cached result for key, computing it with loader on a miss.
+
+        Entries are tied to the day's source file (path and mtime), so replacing or
+        rewriting it invalidates them; today's file is still being written, so its
+        entries also expire after a short TTL.
+        """
+        version = self._source_version(date_str)
+        value = self._cache_lookup(key, version)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self._cache_store(key, date_str, version, value)
+        return value
+
+    def _source_version(self, date_str: str) -> Optional[Tuple[str, int]]:
+        """Identify the current contents of the day's database file"""
+        db_path = self._get_db_path(date_str)
+        if db_path is None:
+            return None
+        try:
+            mtime_ns = db_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        # A live database takes its writes in the -wal file until a checkpoint touches the main file
+        try:
+            mtime_ns = max(mtime_ns, db_path.with_name(db_path.name + "-wal").stat().st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return db_path.name, mtime_ns
+
+    def _cache_lookup(self, key: Tuple, version: Optional[Tuple[str, int]]) -> Any:
+        with self._cache_lock:
+            cached = self._response_cache.get(key)
+            if cached is None:
+                return None
+            expires_at, cached_version, value = cached
+            if cached_version == version and (expires_at is None or time.monotonic() < expires_at):
+                self._response_cache.move_to_end(key)
+                return value
+            # Stale: the source file changed or today's TTL ran out
+            del self._response_cache[key]
+        return None
+
+    def _cache_store(self, key: Tuple, date_str: str, version: Optional[Tuple[str, int]], value: Any):
+        is_today = date_str == date.today().isoformat()
+        expires_at = time.monotonic() + settings.TODAY_CACHE_TTL_SECONDS if is_today else None
+        with self._cache_lock:
+            self._response_cache[key] = (expires_at, version, value)
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > settings.MAX_RESPONSE_CACHE_ENTRIES:
+                self._response_cache.popitem(last=False)
     
+    def get_rendered(
+        self, key: Tuple, date_str: str, render: Callable[[], Optional[bytes]]
+    ) -> Optional[Tuple[bytes, str]]:
+        """Cache a pre-serialized response body and its ETag under the same rules as the data"""
+        def render_with_etag() -> Optional[Tuple[bytes, str]]:
+            body = render()
+            return None if body is None else (body, _etag(body))
+        return self._cached(("rendered",) + key, date_str, render_with_etag)
+
+    def get_cached_rendered(self, key: Tuple, date_str: str) -> Optional[Tuple[bytes, str]]:
+        """Return a previously stored response body and ETag without rendering on a miss"""
+        return self._cache_lookup(("rendered",) + key, self._source_version(date_str))
+
+    def store_rendered(self, key: Tuple, date_str: str, body: bytes):
+        """Store a response body that was rendered (e.g. streamed) outside get_rendered"""
+        self._cache_store(("rendered",) + key, date_str, self._source_version(date_str), (body, _etag(body)))
+
     def get_available_trading_days(self) -> List[str]:
         """Get all available trading days from data folder"""
         try:
-            dates = set()  # Use set to avoid duplicates
-            
-            # Look for both compressed and uncompressed files
-            for file_path in self.data_folder.glob(f"{settings.DB_PREFIX}*"):
-                filename = file_path.name
-                
-                # Handle compressed files
-                if filename.endswith(f"{settings.DB_EXTENSION}{settings.COMPRESSED_EXTENSION}"):
-                    date_part = filename.replace(settings.DB_PREFIX, "").replace(f"{settings.DB_EXTENSION}{settings.COMPRESSED_EXTENSION}", "")
-                # Handle uncompressed files
-                elif filename.endswith(settings.DB_EXTENSION):
-                    date_part = filename.replace(settings.DB_PREFIX, "").replace(settings.DB_EXTENSION, "")
-                else:
-                    continue
-                
-                try:
-                    # Validate date format
-                    datetime.strptime(date_part, "%Y-%m-%d")
-                    dates.add(date_part)  # Add to set (automatically deduplicates)
-                except ValueError:
-                    continue
-            
-            return sorted(list(dates), reverse=True)  # Convert set back to sorted list
+            # The folder's mtime changes whenever a day's file is added, renamed or removed
+            return list(_scan_trading_days(self.data_folder, self.data_folder.stat().st_mtime_ns))
         except Exception as e:
             logger.error(f"Error getting trading days: {str(e)}")
             return []
@@ -56,45 +220,208 @@ class DataService:
         """Get database path for given date (compressed or uncompressed)"""
         db_filename = f"{settings.DB_PREFIX}{date_str}{settings.DB_EXTENSION}"
         compressed_path = self.data_folder / f"{db_filename}{settings.COMPRESSED_EXTENSION}"
+        legacy_compressed_path = self.data_folder / f"{db_filename}{settings.LEGACY_COMPRESSED_EXTENSION}"
         uncompressed_path = self.data_folder / db_filename
         
         if compressed_path.exists():
             return compressed_path
+        elif legacy_compressed_path.exists():
+            return legacy_compressed_path
         elif uncompressed_path.exists():
             return uncompressed_path
         else:
             return None
     
 
-    def _get_db_connection(self, date_str: str) -> Optional[sqlite3.Connection]:
-        """Get database connection (handle compressed/uncompressed files)"""
+    def _decompress(self, db_path: Path) -> bytes:
+        """Read a zstd or legacy gzip database file into memory"""
+        if db_path.suffix == settings.COMPRESSED_EXTENSION:
+            # decompressobj copes with frames written without a content size
+            # A fresh decompressor per call: zstd contexts are not safe to share between threads
+            return zstandard.ZstdDecompressor().decompressobj().decompress(db_path.read_bytes())
+        compressed = db_path.read_bytes()
+        # Archives are a single gzip member: inflate it straight through zlib and skip gzip's
+        # member-by-member framing; anything left over means a multi-member file, so let gzip handle it
+        inflater = zlib.decompressobj(wbits=31)
+        data = inflater.decompress(compressed)
+        if inflater.unused_data or not inflater.eof:
+            return gzip.decompress(compressed)
+        return data
+
+    def _materialize_db(
+        self, db_path: Path, connect: bool = False
+    ) -> Tuple[Tuple[Path, int], Optional[sqlite3.Connection]]:
+        """Decompress and index db_path once, returning its pool key while unchanged.
+
+        With connect, also opens a connection to the in-memory image; it is opened under the same
+        lock that finds the image, since a store freed by eviction would open as an empty database.
+        """
+        with self._materialize_lock:
+            path_lock = self._materialize_path_locks.setdefault(db_path, threading.Lock())
+        # Held per file for the whole decompression, so concurrent cold requests for one day share
+        # an image while different days decompress in parallel
+        with path_lock:
+            return self._materialize_db_locked(db_path, connect)
+
+    def _materialize_db_locked(
+        self, db_path: Path, connect: bool
+    ) -> Tuple[Tuple[Path, int], Optional[sqlite3.Connection]]:
+        mtime_ns = db_path.stat().st_mtime_ns
+        with self._materialize_lock:
+            cached = self._materialized_dbs.get(db_path)
+            if cached is not None and cached[0] == mtime_ns:
+                self._materialized_dbs.move_to_end(db_path)
+                return (db_path, mtime_ns), self._connect_image(cached[1]) if connect else None
+
+        raw = bytearray(self._decompress(db_path))
+        # Archives taken from a WAL database keep the WAL flag, which in-memory databases can't open;
+        # header bytes 18/19 back to 1 (rollback journal) is safe since no -wal file goes with it
+        raw[18:20] = b"\x01\x01"
+
+        # The in-memory copy is ours to modify, so index it once for the read queries, then copy it
+        # into a shared store: every pooled connection reads that one image instead of its own copy
+        uri = f"file:/{db_path.name}-{next(_memdb_ids)}?vfs=memdb"
+        holder = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        index_conn = sqlite3.connect(":memory:")
+        try:
+            index_conn.deserialize(raw)
+            del raw
+            index_conn.executescript(READ_INDEXES)
+            index_conn.backup(holder)
+            size = holder.execute("PRAGMA page_count").fetchone()[0] * holder.execute("PRAGMA page_size").fetchone()[0]
+        except BaseException:
+            holder.close()
+            raise
+        finally:
+            index_conn.close()
+
+        with self._materialize_lock:
+            previous = self._materialized_dbs.pop(db_path, None)
+            evicted = [] if previous is None else [(db_path, previous)]
+            self._materialized_dbs[db_path] = (mtime_ns, uri, holder, size)
+            # Bound both the number of images and their total size, always keeping the newest
+            total_size = sum(entry[3] for entry in self._materialized_dbs.values())
+            while len(self._materialized_dbs) > 1 and (
+                len(self._materialized_dbs) > settings.MAX_MATERIALIZED_DBS
+                or total_size > settings.MAX_MATERIALIZED_BYTES
+            ):
+                evicted_path, evicted_entry = self._materialized_dbs.popitem(last=False)
+                evicted.append((evicted_path, evicted_entry))
+                total_size -= evicted_entry[3]
+                self._materialize_path_locks.pop(evicted_path, None)
+            image_count = len(self._materialized_dbs)
+            conn = self._connect_image(uri) if connect else None
+        # Borrowed connections keep an evicted store alive until they are released and closed
+        for evicted_path, (evicted_mtime_ns, _, evicted_holder, _) in evicted:
+            evicted_holder.close()
+            self._drop_pool((evicted_path, evicted_mtime_ns))
+        logger.info(
+            f"Loaded {db_path.name} into memory ({size / 1e6:.1f} MB; "
+            f"{image_count} images, {total_size / 1e6:.1f} MB held)"
+        )
+        return (db_path, mtime_ns), conn
+
+    @staticmethod
+    def _connect_image(uri: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for pragma in IMAGE_READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _db_connection(self, date_str: str) -> Iterator[Optional[sqlite3.Connection]]:
+        """Borrow a pooled read-only connection for date_str, or None if the day has no data"""
+        pooled = self._acquire_connection(date_str)
+        if pooled is None:
+            yield None
+            return
+
+        pool_key, conn = pooled
+        try:
+            yield conn
+        finally:
+            self._release_connection(pool_key, conn)
+
+    def _acquire_connection(self, date_str: str) -> Optional[Tuple[Hashable, sqlite3.Connection]]:
+        """Take an idle connection from the database's pool, opening a new one if none is free"""
         db_path = self._get_db_path(date_str)
         if not db_path:
             return None
         
         try:
-            if db_path.suffix == settings.COMPRESSED_EXTENSION:
-                # Handle compressed file
-                import tempfile
-                with gzip.open(db_path, 'rb') as f_in:
-                    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_file:
-                        temp_file.write(f_in.read())
-                        temp_file.flush()
-                        conn = sqlite3.connect(f"file:{temp_file.name}?mode=ro", uri=True)
-                        return conn
+            is_archive = db_path.suffix in (settings.COMPRESSED_EXTENSION, settings.LEGACY_COMPRESSED_EXTENSION)
+            if is_archive:
+                # Archives are served from a shared in-memory copy of the decompressed image
+                pool_key, _ = self._materialize_db(db_path)
             else:
-                # Handle uncompressed file
-                return sqlite3.connect(f"file:{str(db_path)}?mode=ro", uri=True)
+                # Today's file is still being written by the capture script
+                pool_key = db_path
+
+            with self._pool_lock:
+                pool = self._pools.get(pool_key)
+                if pool is None:
+                    pool = self._pools[pool_key] = queue.Queue(maxsize=settings.DB_POOL_SIZE)
+                self._pools.move_to_end(pool_key)
+                # Keep connections only for recently used databases (e.g. not yesterday's live file)
+                evicted_keys = list(self._pools)[:-settings.MAX_POOLED_DBS]
+            for evicted_key in evicted_keys:
+                self._drop_pool(evicted_key)
+            try:
+                return pool_key, pool.get_nowait()
+            except queue.Empty:
+                pass
+
+            if is_archive:
+                # Normally a cache hit; reloads the image if it was evicted since the lookup above
+                return self._materialize_db(db_path, connect=True)
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            for pragma in READ_PRAGMAS:
+                conn.execute(pragma)
+            return pool_key, conn
         
         except Exception as e:
             logger.error(f"Error connecting to database for {date_str}: {str(e)}")
             return None
 
-    
-    def _load_instruments(self, conn: sqlite3.Connection, date_str: str) -> Dict[int, InstrumentInfo]:
-        """Load and cache instruments for a given date"""
-        if date_str in self._instruments_cache:
-            return self._instruments_cache[date_str]
+    def _release_connection(self, pool_key: Hashable, conn: sqlite3.Connection):
+        """Return a connection to its pool, closing it if the pool is full or was dropped"""
+        with self._pool_lock:
+            pool = self._pools.get(pool_key)
+            if pool is not None:
+                try:
+                    pool.put_nowait(conn)
+                    return
+                except queue.Full:
+                    pass
+        conn.close()
+
+    def _drop_pool(self, pool_key: Hashable):
+        """Close idle connections in a pool; borrowed ones are closed when released"""
+        with self._pool_lock:
+            pool = self._pools.pop(pool_key, None)
+        while pool is not None:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _load_instruments(self, conn: sqlite3.Connection, date_str: str) -> Tuple[Dict[int, InstrumentInfo], InstrumentIndex]:
+        """Load and cache instruments for a given date, with their (underlying, expiry) index.
+
+        The cache is tied to the day's source version, so the live day picks up newly seen instruments.
+        """
+        version = self._source_version(date_str)
+        with self._cache_lock:
+            cached = self._instruments_cache.get(date_str)
+        if cached is not None and cached[0] == version:
+            return cached[1:]
+
+        instruments = self._read_instruments_pickle(date_str, version)
+        if instruments is not None:
+            loaded = (instruments, _index_instruments(instruments))
+            with self._cache_lock:
+                self._instruments_cache[date_str] = (version,) + loaded
+            return loaded
         
         try:
             query = """
@@ -103,125 +430,295 @@ class DataService:
                 ORDER BY id
             """
             
-            df = pd.read_sql_query(query, conn)
-            
-            instruments = {}
-            for _, row in df.iterrows():
-                instruments[row['id']] = InstrumentInfo(
-                    id=row['id'],
-                    symbol=row['symbol'],
-                    underlying_symbol=row['underlying_symbol'] or "",
-                    type=row['type'] or "",
-                    strike=row['strike'],
-                    expiry=row['expiry']
+            # Rows come straight from our own schema, so the unvalidated Structs are safe.
+            # Underlying, type and expiry repeat across instruments (and days); interning makes
+            # them share one string each
+            intern = sys.intern
+            instruments = {
+                instrument_id: InstrumentInfo(
+                    id=instrument_id, symbol=symbol, underlying_symbol=intern(underlying_symbol or ""),
+                    type=intern(instrument_type or ""), strike=strike,
+                    expiry=None if expiry is None else intern(expiry)
                 )
+                for instrument_id, symbol, underlying_symbol, instrument_type, strike, expiry
+                in conn.execute(query)
+            }
             
-            self._instruments_cache[date_str] = instruments
-            return instruments
+            loaded = (instruments, _index_instruments(instruments))
+            with self._cache_lock:
+                self._instruments_cache[date_str] = (version,) + loaded
+            self._write_instruments_pickle(date_str, version, instruments)
+            return loaded
         
         except Exception as e:
             logger.error(f"Error loading instruments for {date_str}: {str(e)}")
-            return {}
+            return {}, {}
+
+    def _instruments_pickle_path(self, date_str: str) -> Path:
+        return self.data_folder / f"{settings.INSTRUMENTS_CACHE_PREFIX}{date_str}.pkl"
+
+    def _read_instruments_pickle(
+        self, date_str: str, version: Optional[Tuple[str, int]]
+    ) -> Optional[Dict[int, InstrumentInfo]]:
+        """Load the on-disk instruments cache if it was written from this version of the day's database"""
+        if version is None:
+            return None
+        try:
+            with open(self._instruments_pickle_path(date_str), "rb") as f:
+                pickled_version, instruments = pickle.load(f)
+            return instruments if pickled_version == version else None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable instruments cache for {date_str}: {e}")
+            return None
+
+    def _write_instruments_pickle(
+        self, date_str: str, version: Optional[Tuple[str, int]], instruments: Dict[int, InstrumentInfo]
+    ):
+        """Persist instruments so restarts skip the SQL load; today's file is still changing"""
+        if version is None or date_str == date.today().isoformat():
+            return
+        def write(tmp_path: str):
+            with open(tmp_path, "wb") as f:
+                pickle.dump((version, instruments), f, protocol=5)
+        self._atomic_sidecar_write(self._instruments_pickle_path(date_str), write)
+
+    def _atomic_sidecar_write(self, path: Path, write_fn: Callable[[str], None]):
+        """Write a sidecar file via write_fn(temp path), then rename it into place.
+
+        Each call gets its own temp file, so concurrent loads of the same day cannot collide,
+        and a failed write leaves nothing behind. Sidecars are only caches, so failures are logged.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_folder, prefix=path.name, suffix=".tmp")
+        try:
+            os.close(fd)
+            write_fn(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write {path.name}: {e}")
+            Path(tmp_path).unlink(missing_ok=True)
     
+    def _markers_db_path(self, date_str: str) -> Path:
+        return self.data_folder / f"{settings.MARKERS_DB_PREFIX}{date_str}.db"
+
+    def _read_trade_markers(
+        self, conn: sqlite3.Connection, date_str: str, version: Optional[Tuple[str, int]], snapshot_count: int
+    ) -> Optional[List[Optional[TradeMarker]]]:
+        """Load precomputed markers (one per snapshot, in timeseries order) from the sidecar database"""
+        markers_path = self._markers_db_path(date_str)
+        if version is None or not markers_path.exists():
+            return None
+        try:
+            markers_conn = sqlite3.connect(f"file:{markers_path}?mode=ro", uri=True)
+            try:
+                for pragma in READ_PRAGMAS:
+                    markers_conn.execute(pragma)
+                # Markers are only valid for the exact database version they were computed from
+                if markers_conn.execute("SELECT name, mtime_ns FROM source").fetchone() != version:
+                    return None
+                rows = markers_conn.execute(
+                    "SELECT type, summary, changes_json FROM trade_markers ORDER BY seq"
+                ).fetchall()
+            finally:
+                markers_conn.close()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable trade markers for {date_str}: {e}")
+            return None
+        if len(rows) != snapshot_count:
+            return None
+
+        # Changes are stored without their instrument and re-linked to the shared instrument objects
+        instruments, _ = self._load_instruments(conn, date_str)
+        markers = []
+        for marker_type, summary, changes_json in rows:
+            if marker_type is None:
+                markers.append(None)
+                continue
+            changes = [
+                PositionChange(**change, instrument=instruments.get(change["instrument_id"]))
+                for change in orjson.loads(changes_json)
+            ]
+            markers.append(TradeMarker(
+                type=TradeMarkerType(marker_type), changes=changes, summary=summary
+            ))
+        return markers
+
+    def _write_trade_markers(
+        self, date_str: str, version: Optional[Tuple[str, int]], snapshots: List[SnapshotData]
+    ):
+        """Persist computed markers so later loads skip the analyzer; today's file is still changing"""
+        if version is None or date_str == date.today().isoformat():
+            return
+        rows = []
+        for seq, snapshot in enumerate(snapshots):
+            marker = snapshot.trade_marker
+            if marker is None:
+                rows.append((seq, None, None, None))
+            else:
+                changes = [msgspec.structs.asdict(change) for change in marker.changes]
+                for change in changes:
+                    del change["instrument"]
+                rows.append((seq, TradeMarkerType(marker.type).value, marker.summary, orjson.dumps(changes)))
+
+        def write(tmp_path: str):
+            markers_conn = sqlite3.connect(tmp_path)
+            try:
+                with markers_conn:
+                    markers_conn.execute(
+                        "CREATE TABLE trade_markers (seq INTEGER PRIMARY KEY, type TEXT, summary TEXT, changes_json BLOB)"
+                    )
+                    markers_conn.executemany("INSERT INTO trade_markers VALUES (?, ?, ?, ?)", rows)
+                    markers_conn.execute("CREATE TABLE source (name TEXT, mtime_ns INTEGER)")
+                    markers_conn.execute("INSERT INTO source VALUES (?, ?)", version)
+            finally:
+                markers_conn.close()
+        self._atomic_sidecar_write(self._markers_db_path(date_str), write)
+
     def _load_snapshots_batch(
         self, conn: sqlite3.Connection, date_str: str, filters: Optional[List[str]] = None
-    ) -> List[SnapshotData]:
-        """Load all snapshots with positions, applying filters if provided."""
+    ) -> Tuple[List[SnapshotData], np.ndarray, np.ndarray]:
+        """Load all snapshots with positions, applying filters if provided.
+
+        Alongside the snapshots, returns their pnl and underlying price (NaN when absent)
+        as contiguous float arrays so the summary can be computed without walking the models.
+        """
         try:
-            instruments = self._load_instruments(conn, date_str)
+            instruments, instrument_index = self._load_instruments(conn, date_str)
             
-            allowed_instrument_ids: Set[int] = set()
+            # Push the underlying/expiry filter into the join so SQLite only returns matching positions;
+            # it sits in the ON clause so snapshots without matching positions are still listed
+            join_filter, params, filtered_pnl = "", [], {}
             if filters:
                 parsed_filters = set()
                 for f in filters:
                     parts = f.split('_')
                     if len(parts) == 2:
                         parsed_filters.add((parts[0], parts[1]))
-                
-                for inst_id, inst_info in instruments.items():
-                    if (inst_info.underlying_symbol, inst_info.expiry) in parsed_filters:
-                        allowed_instrument_ids.add(inst_id)
 
-            query = """
-                SELECT 
-                    s.id as snapshot_id, s.timestamp, s.total_pnl,
-                    pd.instrument_id, pd.quantity, pd.avg_price, pd.last_price,
-                    pd.unbooked_pnl, pd.booked_pnl, pd.underlying_price
-                FROM snapshots s
-                LEFT JOIN position_details pd ON s.id = pd.snapshot_id
-                ORDER BY s.timestamp, pd.instrument_id
-            """
-            df = pd.read_sql_query(query, conn)
-            if df.empty: return []
+                # Resolve the filters to instrument ids from the cached index instead of a subquery
+                allowed_ids = sorted(set().union(*(instrument_index.get(pf, ()) for pf in parsed_filters)))
+                if allowed_ids:
+                    instrument_filter = f"instrument_id IN ({','.join('?' * len(allowed_ids))})"
+                    join_filter = f" AND pd.{instrument_filter}"
+                    params = allowed_ids
+
+                    # A filtered view's pnl is the sum over the matching positions; aggregate it in SQL
+                    filtered_pnl = dict(conn.execute(f"""
+                        SELECT snapshot_id, SUM(unbooked_pnl + booked_pnl)
+                        FROM position_details WHERE {instrument_filter}
+                        GROUP BY snapshot_id
+                    """, params).fetchall())
+                else:
+                    join_filter = None
+
+            if join_filter is None:
+                # Nothing can match: list the snapshots alone. A constant-false ON clause would make
+                # SQLite scan every position for every snapshot instead of using the index
+                query = """
+                    SELECT 
+                        s.id as snapshot_id, s.timestamp, s.total_pnl,
+                        NULL, NULL, NULL, NULL, NULL, NULL, NULL
+                    FROM snapshots s
+                    ORDER BY s.timestamp, s.id
+                """
+            else:
+                query = f"""
+                    SELECT 
+                        s.id as snapshot_id, s.timestamp, s.total_pnl,
+                        pd.instrument_id, pd.quantity, pd.avg_price, pd.last_price,
+                        pd.unbooked_pnl, pd.booked_pnl, pd.underlying_price
+                    FROM snapshots s
+                    LEFT JOIN position_details pd ON s.id = pd.snapshot_id{join_filter}
+                    ORDER BY s.timestamp, s.id, pd.instrument_id
+                """
+            rows = conn.execute(query, params).fetchall()
+            if not rows:
+                return [], np.empty(0), np.empty(0)
+
+            # ORDER BY keeps each snapshot's rows contiguous; find the group boundaries in one vectorized pass
+            snapshot_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            starts = np.flatnonzero(np.diff(snapshot_ids, prepend=snapshot_ids[0] - 1)).tolist()
+            ends = starts[1:] + [len(rows)]
+
+            # Build every position in one tight pass over the raw tuples (None for rows without one)
+            nan = float("nan")
+            built = [
+                None if (instrument := instruments.get(instrument_id)) is None else PositionDetail(
+                    instrument_id=instrument_id, instrument=instrument, quantity=quantity,
+                    avg_price=nan if avg_price is None else avg_price,
+                    last_price=nan if last_price is None else last_price,
+                    unbooked_pnl=nan if unbooked_pnl is None else unbooked_pnl,
+                    booked_pnl=nan if booked_pnl is None else booked_pnl,
+                    underlying_price=nan if position_underlying is None else position_underlying
+                )
+                for (_, _, _, instrument_id, quantity, avg_price, last_price,
+                     unbooked_pnl, booked_pnl, position_underlying) in rows
+            ]
+
+            # Parse every snapshot timestamp in one C-level pass; Python 3.11+ fromisoformat accepts
+            # a trailing 'Z' natively and, unlike datetime64, keeps any UTC offset
+            timestamps = list(map(datetime.fromisoformat, [rows[start][1] for start in starts]))
 
             snapshots = []
-            grouped = df.groupby('snapshot_id')
-            
-            for snapshot_id, group in grouped:
-                first_row = group.iloc[0]
-                timestamp = datetime.fromisoformat(first_row['timestamp'].replace('Z', '+00:00'))
-                
-                positions = []
-                underlying_price = None
-                recalculated_pnl = 0.0
-
-                for _, row in group.iterrows():
-                    if pd.notna(row['instrument_id']):
-                        instrument_id = int(row['instrument_id'])
-                        
-                        if not filters or instrument_id in allowed_instrument_ids:
-                            if instrument_id in instruments:
-                                positions.append(PositionDetail(
-                                    instrument_id=instrument_id,
-                                    instrument=instruments[instrument_id],
-                                    quantity=int(row['quantity']),
-                                    avg_price=float(row['avg_price']),
-                                    last_price=float(row['last_price']),
-                                    unbooked_pnl=float(row['unbooked_pnl']),
-                                    booked_pnl=float(row['booked_pnl']),
-                                    underlying_price=float(row['underlying_price'])
-                                ))
-                                if filters:
-                                    recalculated_pnl += (float(row['unbooked_pnl']) + float(row['booked_pnl']))
-                                if underlying_price is None:
-                                    underlying_price = float(row['underlying_price'])
-                
-                final_pnl = recalculated_pnl if filters else float(first_row['total_pnl'])
+            pnl_series, underlying_series = array('d'), array('d')
+            for start, end, timestamp in zip(starts, ends, timestamps):
+                positions = [position for position in built[start:end] if position is not None]
+                underlying_price = positions[0].underlying_price if positions else None
+                snapshot_id, _, total_pnl = rows[start][:3]
+
+                if filters:
+                    final_pnl = _as_float(filtered_pnl.get(snapshot_id, 0.0))
+                else:
+                    final_pnl = _as_float(total_pnl)
                 
+                pnl_series.append(final_pnl)
+                underlying_series.append(nan if underlying_price is None else underlying_price)
                 snapshots.append(SnapshotData(
                     timestamp=timestamp, total_pnl=final_pnl,
                     underlying_price=underlying_price, position_count=len(positions),
                     positions=positions, trade_marker=None
                 ))
             
-            return sorted(snapshots, key=lambda x: x.timestamp)
+            # Already in timestamp order: the query sorts by (timestamp, id) and groups are walked in order
+            return (snapshots,
+                    np.frombuffer(pnl_series, dtype=np.float64),
+                    np.frombuffer(underlying_series, dtype=np.float64))
         
         except Exception as e:
             logger.error(f"Error loading snapshots for {date_str}: {e}")
-            return []
+            return [], np.empty(0), np.empty(0)
     
-    def _calculate_summary(self, snapshots: List[SnapshotData], date_str: str) -> DaySummary:
-        """Calculate day summary statistics"""
+    def _calculate_summary(
+        self, snapshots: List[SnapshotData], date_str: str, pnl_series: np.ndarray, underlying_series: np.ndarray,
+        total_trades: Optional[int] = None
+    ) -> DaySummary:
+        """Calculate day summary statistics; total_trades is counted from the markers unless given"""
         if not snapshots:
             return DaySummary(
                 date=date_str, total_snapshots=0, total_trades=0,
                 final_pnl=0.0, min_pnl=0.0, max_pnl=0.0
             )
         
-        pnl_values = [s.total_pnl for s in snapshots]
-        min_pnl, max_pnl, final_pnl = min(pnl_values), max(pnl_values), pnl_values[-1]
+        min_pnl, max_pnl, final_pnl = float(pnl_series.min()), float(pnl_series.max()), float(pnl_series[-1])
         
-        underlying_prices = [s.underlying_price for s in snapshots if s.underlying_price is not None]
+        underlying_prices = underlying_series[~np.isnan(underlying_series)]
         underlying_range = None
-        if underlying_prices:
-            underlying_range = {"min": min(underlying_prices), "max": max(underlying_prices),
-                                "open": underlying_prices[0], "close": underlying_prices[-1]}
+        if underlying_prices.size:
+            underlying_range = {"min": float(underlying_prices.min()), "max": float(underlying_prices.max()),
+                                "open": float(underlying_prices[0]), "close": float(underlying_prices[-1])}
         
-        total_trades = sum(1 for s in snapshots if s.trade_marker and s.trade_marker.type != "none")
+        # Enum members are singletons: an identity check skips str.__ne__ on every snapshot
+        if total_trades is None:
+            total_trades = sum(1 for s in snapshots
+                               if s.trade_marker is not None and s.trade_marker.type is not TradeMarkerType.NONE)
         market_open = snapshots[0].timestamp.strftime("%H:%M:%S")
         market_close = snapshots[-1].timestamp.strftime("%H:%M:%S")
         
-        return DaySummary(
+        # Every value is computed here from trusted rows, so skip pydantic validation
+        return DaySummary.model_construct(
             date=date_str, total_snapshots=len(snapshots), total_trades=total_trades,
             final_pnl=final_pnl, market_open=market_open, market_close=market_close,
             min_pnl=min_pnl, max_pnl=max_pnl, underlying_range=underlying_range
@@ -229,77 +726,153 @@ class DataService:
     
     def get_trading_day_data(self, date_str: str, filters: Optional[List[str]] = None) -> Optional[Dict]:
         """Get complete trading day data with trade markers, applying filters."""
-        conn = self._get_db_connection(date_str)
-        if not conn: return None
+        return self._cached(("data", date_str, tuple(sorted(filters or ()))), date_str,
+                            lambda: self._build_trading_day_data(date_str, filters))
+
+    def get_trading_day_page(
+        self, date_str: str, filters: Optional[List[str]], offset: int, limit: int
+    ) -> Optional[Dict]:
+        """Get one page of the day's timeseries; the summary still covers the whole day."""
+        data = self.get_trading_day_data(date_str, filters)
+        if data is None: return None
+
+        total = len(data["timeseries"])
+        end = offset + limit
+        return {
+            **data,
+            "timeseries": data["timeseries"][offset:end],
+            "meta": {"total": total, "offset": offset, "limit": limit,
+                     "next_offset": end if end < total else None}
+        }
+
+    def _build_trading_day_data(self, date_str: str, filters: Optional[List[str]] = None) -> Optional[Dict]:
+        # Taken before reading, so sidecars are never labelled with a newer version than their data
+        version = self._source_version(date_str)
+        with self._db_connection(date_str) as conn:
+            if not conn: return None
         
-        try:
-            snapshots = self._load_snapshots_batch(conn, date_str, filters)
-            if not snapshots: return None
-            
-            from .trade_analyzer import TradeAnalyzer
-            analyzer = TradeAnalyzer()
-            snapshots_with_markers = analyzer.calculate_trade_markers(snapshots)
+            try:
+                snapshots, pnl_series, underlying_series = self._load_snapshots_batch(conn, date_str, filters)
+                if not snapshots: return None
+
+                # Markers depend on which positions survive the filter, so only the unfiltered set is persisted
+                markers = None if filters else self._read_trade_markers(conn, date_str, version, len(snapshots))
+                if markers is not None:
+                    for snapshot, marker in zip(snapshots, markers):
+                        snapshot.trade_marker = marker
+                    snapshots_with_markers = snapshots
+                else:
+                    from .trade_analyzer import TradeAnalyzer
+                    analyzer = TradeAnalyzer()
+                    snapshots_with_markers = analyzer.calculate_trade_markers(snapshots)
+                    if not filters:
+                        self._write_trade_markers(date_str, version, snapshots_with_markers)
             
-            summary = self._calculate_summary(snapshots_with_markers, date_str)
+                summary = self._calculate_summary(snapshots_with_markers, date_str, pnl_series, underlying_series)
             
-            return {"date": date_str, "summary": summary, "timeseries": snapshots_with_markers}
+                return {"date": date_str, "summary": summary, "timeseries": snapshots_with_markers}
         
-        except Exception as e:
-            logger.error(f"Error getting trading day data for {date_str}: {e}")
-            return None
-        finally:
-            conn.close()
+            except Exception as e:
+                logger.error(f"Error getting trading day data for {date_str}: {e}")
+                return None
     
     def get_day_summary_only(self, date_str: str, filters: Optional[List[str]] = None) -> Optional[DaySummary]:
         """Get only summary data for a trading day, applying filters."""
-        conn = self._get_db_connection(date_str)
-        if not conn: return None
+        return self._cached(("summary", date_str, tuple(sorted(filters or ()))), date_str,
+                            lambda: self._build_day_summary(date_str, filters))
+
+    def _build_day_summary(self, date_str: str, filters: Optional[List[str]] = None) -> Optional[DaySummary]:
+        with self._db_connection(date_str) as conn:
+            if not conn: return None
         
-        try:
-            # If filters are applied, we must do the full calculation
-            if filters:
-                data = self.get_trading_day_data(date_str, filters)
-                return DaySummary(**data['summary'].dict()) if data else None
+            try:
+                # Filtered pnl depends on the matching positions, so those have to be loaded
+                if filters:
+                    return self._load_snapshots_and_summarize(conn, date_str, filters)
 
-            # Original fast path for no filters
-            df = pd.read_sql_query("SELECT timestamp, total_pnl FROM snapshots ORDER BY timestamp", conn)
-            if df.empty: return None
-            
-            pnl_values = df['total_pnl'].tolist()
-            timestamps = pd.to_datetime(df['timestamp'])
-            
-            return DaySummary(
-                date=date_str, total_snapshots=len(df), total_trades=0,
-                final_pnl=pnl_values[-1],
-                market_open=timestamps.iloc[0].strftime("%H:%M:%S"),
-                market_close=timestamps.iloc[-1].strftime("%H:%M:%S"),
-                min_pnl=min(pnl_values), max_pnl=max(pnl_values)
-            )
-        except Exception as e:
-            logger.error(f"Error getting summary for {date_str}: {e}")
-            return None
-        finally:
-            conn.close()
+                # Fast path for no filters: aggregate in SQL so only one row comes back
+                cur = conn.cursor()
+                total, min_pnl, max_pnl, first_ts, last_ts = cur.execute(
+                    "SELECT COUNT(*), MIN(total_pnl), MAX(total_pnl), MIN(timestamp), MAX(timestamp) FROM snapshots"
+                ).fetchone()
+                if not total: return None
+
+                (final_pnl,) = cur.execute(
+                    "SELECT total_pnl FROM snapshots ORDER BY timestamp DESC, id DESC LIMIT 1"
+                ).fetchone()
+
+                def clock(ts: str) -> str:
+                    return datetime.fromisoformat(ts).strftime("%H:%M:%S")
+
+                return DaySummary.model_construct(
+                    date=date_str, total_snapshots=total, total_trades=0,
+                    final_pnl=final_pnl,
+                    market_open=clock(first_ts), market_close=clock(last_ts),
+                    min_pnl=min_pnl, max_pnl=max_pnl
+                )
+            except Exception as e:
+                logger.error(f"Error getting summary for {date_str}: {e}")
+                return None
+
+    def get_multi_day_summaries(
+        self, dates: List[str], filters: Optional[List[str]] = None
+    ) -> Dict[str, Optional[DaySummary]]:
+        """Get summaries for several trading days, loading uncached days in parallel"""
+        if not dates:
+            return {}
+        # Decompression and SQLite release the GIL, and every worker checks out its own pooled connection
+        with ThreadPoolExecutor(max_workers=min(settings.MAX_WORKERS, len(dates))) as executor:
+            summaries = executor.map(lambda date_str: self.get_day_summary_only(date_str, filters), dates)
+            return dict(zip(dates, summaries))
+
+    def _load_snapshots_and_summarize(
+        self, conn: sqlite3.Connection, date_str: str, filters: Optional[List[str]]
+    ) -> Optional[DaySummary]:
+        """Summarize a (filtered) day without building its trade markers or caching its timeseries"""
+        # The full day may already be loaded for the chart; its summary is the same
+        data = self._cache_lookup(("data", date_str, tuple(sorted(filters or ()))), self._source_version(date_str))
+        if data is not None:
+            return data["summary"]
+
+        snapshots, pnl_series, underlying_series = self._load_snapshots_batch(conn, date_str, filters)
+        if not snapshots: return None
+
+        from .trade_analyzer import TradeAnalyzer
+        total_trades = TradeAnalyzer().count_trades(snapshots)
+        return self._calculate_summary(snapshots, date_str, pnl_series, underlying_series, total_trades)
+
+    def warm_cache(self, days: int = settings.WARM_CACHE_DAYS):
+        """Load filters, summary and full data for the most recent trading days"""
+        def warm(date_str: str):
+            self.get_available_filters(date_str)
+            self.get_day_summary_only(date_str)
+            self.get_trading_day_data(date_str)
+
+        started = time.perf_counter()
+        dates = self.get_available_trading_days()[:days]
+        with ThreadPoolExecutor(max_workers=settings.MAX_WORKERS) as executor:
+            list(executor.map(warm, dates))
+        logger.info(f"Warmed cache for {len(dates)} trading days in {time.perf_counter() - started:.1f}s")
 
     def get_available_filters(self, date_str: str) -> Optional[List[FilterOption]]:
         """Get available underlying/expiry filters for a given trading day."""
-        conn = self._get_db_connection(date_str)
-        if not conn: return None
+        return self._cached(("filters", date_str), date_str, lambda: self._build_available_filters(date_str))
+
+    def _build_available_filters(self, date_str: str) -> Optional[List[FilterOption]]:
+        with self._db_connection(date_str) as conn:
+            if not conn: return None
         
-        try:
-            query = "SELECT DISTINCT underlying_symbol, expiry FROM instruments WHERE underlying_symbol IS NOT NULL AND expiry IS NOT NULL"
-            df = pd.read_sql_query(query, conn)
-            
-            filters = []
-            for _, row in df.iterrows():
-                filters.append(FilterOption(
-                    underlying_symbol=row['underlying_symbol'],
-                    expiry=row['expiry'],
-                    key=f"{row['underlying_symbol']}_{row['expiry']}"
-                ))
-            return sorted(filters, key=lambda x: (x.underlying_symbol, x.expiry))
-        except Exception as e:
-            logger.error(f"Error getting available filters for {date_str}: {e}")
-            return None
-        finally:
-            conn.close()
\ No newline at end of file
+            try:
+                query = "SELECT DISTINCT underlying_symbol, expiry FROM instruments WHERE underlying_symbol IS NOT NULL AND expiry IS NOT NULL"
+                filters = [
+                    FilterOption.model_construct(
+                        underlying_symbol=underlying_symbol,
+                        expiry=expiry,
+                        key=f"{underlying_symbol}_{expiry}"
+                    )
+                    for underlying_symbol, expiry in conn.execute(query)
+                ]
+                return sorted(filters, key=lambda x: (x.underlying_symbol, x.expiry))
+            except Exception as e:
+                logger.error(f"Error getting available filters for {date_str}: {e}")
+                return None
\ No newline at end of file
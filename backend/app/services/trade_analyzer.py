@@ -1,6 +1,6 @@
-import pandas as pd
 import numpy as np
 from typing import List, Dict, Set, Optional
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
 import logging
 
@@ -28,13 +28,29 @@ class TradeAnalyzer:
             
             # First snapshot never has a trade marker
             updated_snapshots.append(snapshots[0])
+
+            # (instrument_id, quantity, avg_price) per position, built once per snapshot; equal
+            # consecutive signatures mean nothing traded, which is by far the common case
+            signatures = [
+                tuple((p.instrument_id, p.quantity, p.avg_price) for p in snapshot.positions)
+                for snapshot in snapshots
+            ]
+            
+            # Rolling position map: each snapshot's map is built at most once and reused as the
+            # previous side of the next comparison
+            prev_map = {p.instrument_id: p for p in snapshots[0].positions}
             
             # Process remaining snapshots in batches
             for i in range(1, len(snapshots)):
                 current_snapshot = snapshots[i]
-                previous_snapshot = snapshots[i - 1]
                 
-                trade_marker = self._compare_snapshots(previous_snapshot, current_snapshot)
+                if signatures[i] == signatures[i - 1]:
+                    # Same instruments, quantities and prices, so prev_map still describes this snapshot
+                    trade_marker = TradeMarker(type=TradeMarkerType.NONE, changes=[], summary="No changes")
+                else:
+                    curr_map = {p.instrument_id: p for p in current_snapshot.positions}
+                    trade_marker = self._diff_maps(prev_map, curr_map)
+                    prev_map = curr_map
                 current_snapshot.trade_marker = trade_marker
                 updated_snapshots.append(current_snapshot)
             
@@ -44,13 +60,26 @@ class TradeAnalyzer:
             logger.error(f"Error calculating trade markers: {str(e)}")
             return snapshots
     
-    def _compare_snapshots(self, prev_snapshot: SnapshotData, curr_snapshot: SnapshotData) -> TradeMarker:
-        """Compare two consecutive snapshots to detect position changes"""
+    def count_trades(self, snapshots: List[SnapshotData]) -> int:
+        """Count snapshots whose marker would not be NONE, without building or attaching markers"""
+        trades = 0
+        prev_signature, prev_map = None, None
+        for snapshot in snapshots:
+            signature = tuple((p.instrument_id, p.quantity, p.avg_price) for p in snapshot.positions)
+            if prev_signature is not None and signature != prev_signature:
+                curr_map = {p.instrument_id: p for p in snapshot.positions}
+                if self._diff_maps(prev_map, curr_map).type is not TradeMarkerType.NONE:
+                    trades += 1
+                prev_map = curr_map
+            elif prev_signature is None:
+                prev_map = {p.instrument_id: p for p in snapshot.positions}
+            prev_signature = signature
+        return trades
+    
+    def _diff_maps(self, prev_positions: Dict[int, PositionDetail],
+                   curr_positions: Dict[int, PositionDetail]) -> TradeMarker:
+        """Compare the position maps of two consecutive snapshots to detect position changes"""
         try:
-            # Create position maps for fast lookup
-            prev_positions = {p.instrument_id: p for p in prev_snapshot.positions}
-            curr_positions = {p.instrument_id: p for p in curr_snapshot.positions}
-            
             # Get all instrument IDs from both snapshots
             all_instrument_ids = set(prev_positions.keys()) | set(curr_positions.keys())
             
@@ -113,8 +142,8 @@ class TradeAnalyzer:
                 )
             
             # Check if it's a square-up (all positions closed)
-            if (len(prev_snapshot.positions) > 0 and 
-                len(curr_snapshot.positions) == 0):
+            if (len(prev_positions) > 0 and 
+                len(curr_positions) == 0):
                 return TradeMarker(
                     type=TradeMarkerType.SQUARE_UP,
                     changes=changes,
@@ -142,9 +171,11 @@ class TradeAnalyzer:
         if not changes:
             return "No changes"
         
-        new_count = sum(1 for c in changes if c.change_type == "new")
-        closed_count = sum(1 for c in changes if c.change_type == "closed")
-        modified_count = sum(1 for c in changes if c.change_type in ["quantity_change", "price_change"])
+        # One pass over the changes instead of one per category
+        counts = Counter(c.change_type for c in changes)
+        new_count = counts["new"]
+        closed_count = counts["closed"]
+        modified_count = counts["quantity_change"] + counts["price_change"]
         
         parts = []
         if new_count > 0:
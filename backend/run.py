@@ -1,3 +1,9 @@
+import sys
+
+# Checked before importing the app, which already needs 3.11 to import cleanly
+if sys.version_info < (3, 11):
+    sys.exit("The Trading Dashboard API requires Python 3.11 or newer")
+
 import uvicorn
 from app.main import app
 
@@ -1,31 +1,59 @@
 import sqlite3
-import random
-import os
+import numpy as np
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-import gzip
+import zstandard as zstd
 
-def create_test_data():
-    """Generate test trading data for NIFTY options with proper P&L tracking"""
+INSTRUMENT_COLUMNS = ("id", "symbol", "underlying_symbol", "type", "strike", "expiry")
+SNAPSHOT_COLUMNS = ("id", "timestamp", "total_pnl")
+POSITION_DETAIL_COLUMNS = ("snapshot_id", "instrument_id", "quantity", "avg_price", "last_price", "unbooked_pnl", "booked_pnl", "underlying_price")
+FLUSH_EVERY = 500  # Snapshots buffered before their rows are written
+MAX_POSITIONS = 6  # Open positions the simulation holds at most
+SNAPSHOT_INTERVAL_SECONDS = 15
+ARCHIVE_COMPRESSION_LEVEL = 1  # zstd level 1 beats gzip -1 on both speed and size for these images
+
+@lru_cache(maxsize=None)
+def insert_sql(table, cols, row_count):
+    """INSERT statement for row_count rows; the same string object is handed back on every call,
+    so sqlite3's statement cache finds the prepared statement without rebuilding or rehashing it"""
+    placeholders = f"({', '.join('?' * len(cols))})"
+    return f"INSERT INTO {table} ({', '.join(cols)}) VALUES " + ", ".join([placeholders] * row_count)
+
+def bulk_insert(cursor, table, cols, rows, chunk=50):
+    """Insert rows with multi-row VALUES statements, chunk rows per statement.
+
+    chunk * len(cols) must stay under SQLite's 32766 bound-parameter limit; past a few
+    hundred rows the longer statements cost more to prepare than they save.
+    """
+    for start in range(0, len(rows), chunk):
+        batch = rows[start:start + chunk]
+        cursor.execute(insert_sql(table, cols, len(batch)), [value for row in batch for value in row])
+
+def create_test_data(seed=None):
+    """Generate test trading data for NIFTY options with proper P&L tracking; a seed makes it reproducible"""
     
+    rng = np.random.default_rng(seed)
     data_folder = Path("data")
     data_folder.mkdir(exist_ok=True)
     
     test_date = datetime.now().strftime("%Y-%m-%d")
     db_filename = f"data-{test_date}.db"
-    db_path = data_folder / db_filename
-    
-    if db_path.exists(): os.remove(db_path)
     
-    conn = sqlite3.connect(str(db_path))
+    # Built entirely in memory and compressed straight from the serialized image; only the archive
+    # touches disk. Autocommit mode: the transaction below is managed explicitly
+    conn = sqlite3.connect(":memory:", isolation_level=None)
     cursor = conn.cursor()
     
-    cursor.execute("CREATE TABLE IF NOT EXISTS instruments (id INTEGER PRIMARY KEY, symbol TEXT UNIQUE NOT NULL, underlying_symbol TEXT, type TEXT, strike REAL, expiry TEXT)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS instruments (id INTEGER PRIMARY KEY, symbol TEXT NOT NULL, underlying_symbol TEXT, type TEXT, strike REAL, expiry TEXT)")
     cursor.execute("CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, total_pnl REAL)")
     cursor.execute("CREATE TABLE IF NOT EXISTS position_details (snapshot_id INTEGER, instrument_id INTEGER, quantity INTEGER, avg_price REAL, last_price REAL, unbooked_pnl REAL, booked_pnl REAL, underlying_price REAL, FOREIGN KEY (snapshot_id) REFERENCES snapshots (id), FOREIGN KEY (instrument_id) REFERENCES instruments (id))")
     
     print(f"Creating test data for date: {test_date}")
     
+    # One transaction for every instrument, snapshot and position row
+    cursor.execute("BEGIN")
+    
     nifty_price = 21500
     instruments = []
     instrument_id_counter = 1
@@ -38,79 +66,109 @@ def create_test_data():
                 instruments.append({'id': instrument_id_counter, 'symbol': symbol, 'underlying_symbol': 'NIFTY', 'type': option_type, 'strike': strike, 'expiry': expiry})
                 instrument_id_counter += 1
 
-    for instrument in instruments:
-        cursor.execute("INSERT INTO instruments (id, symbol, underlying_symbol, type, strike, expiry) VALUES (?, ?, ?, ?, ?, ?)",
-                       (instrument['id'], instrument['symbol'], instrument['underlying_symbol'], instrument['type'], instrument['strike'], instrument['expiry']))
+    bulk_insert(cursor, "instruments", INSTRUMENT_COLUMNS, [tuple(instrument[col] for col in INSTRUMENT_COLUMNS) for instrument in instruments])
+    # Symbols are unique as in the capture schema; the index is built once the rows are in
+    cursor.execute("CREATE UNIQUE INDEX idx_instruments_symbol ON instruments(symbol)")
     
     print(f"Created {len(instruments)} instruments")
     
     start_time = datetime.strptime(f"{test_date} 09:15:00", "%Y-%m-%d %H:%M:%S")
     end_time = datetime.strptime(f"{test_date} 15:30:00", "%Y-%m-%d %H:%M:%S")
     
-    current_time = start_time
+    num_steps = int((end_time - start_time).total_seconds()) // SNAPSHOT_INTERVAL_SECONDS + 1
+    # Fixed cadence: every snapshot's timestamp string is known up front. datetime64[s] renders
+    # exactly like datetime.isoformat() without microseconds, and in one vectorized pass
+    timestamps = (np.datetime64(start_time, 's')
+                  + np.arange(num_steps) * np.timedelta64(SNAPSHOT_INTERVAL_SECONDS, 's')).astype(str).tolist()
+    
+    # Every random draw for the day in one batched call each; the loop only indexes into them
+    walk = rng.uniform(-0.5, 0.5, num_steps).tolist()
+    trade_rolls = rng.random(num_steps).tolist()
+    trade_is_new = (rng.random(num_steps) < 0.5).tolist()
+    instrument_picks = rng.integers(0, len(instruments), num_steps).tolist()
+    quantity_picks = rng.choice([25, 50, -25, -50], num_steps).tolist()
+    entry_prices = rng.uniform(15, 150, num_steps).tolist()
+    close_picks = rng.random(num_steps).tolist()  # Scaled to the positions open at close time
+    time_values = rng.uniform(8, 35, (num_steps, MAX_POSITIONS)).tolist()
+    price_noise = rng.uniform(-3, 3, (num_steps, MAX_POSITIONS)).tolist()
+    
     snapshot_id = 1
-    current_positions = {}
+    # Open positions as parallel lists (one entry per slot); a close swaps the last slot into its place
+    open_ids, open_strikes, open_is_call, open_qty, open_avg, open_booked, open_last = [], [], [], [], [], [], []
+    open_columns = (open_ids, open_strikes, open_is_call, open_qty, open_avg, open_booked, open_last)
     underlying_price = nifty_price
     snapshots_created = 0
+    # snapshots and position_details rows, flushed every FLUSH_EVERY snapshots
+    snapshots_buffer, details_buffer = [], []
     
-    while current_time <= end_time:
-        underlying_price += random.uniform(-0.5, 0.5)
+    for step in range(num_steps):
+        underlying_price += walk[step]
         
-        if random.random() < 0.08:
-            trade_type = random.choice(['new', 'close'])
-            if trade_type == 'new' and len(current_positions) < 6:
-                instrument = random.choice(instruments)
-                if instrument['id'] not in current_positions:
-                    current_positions[instrument['id']] = {'instrument': instrument, 'quantity': random.choice([25, 50, -25, -50]), 'avg_price': max(5, random.uniform(15, 150)), 'booked_pnl': 0.0}
-            elif trade_type == 'close' and current_positions:
-                instrument_id_to_close = random.choice(list(current_positions.keys()))
-                pos = current_positions.pop(instrument_id_to_close)
-                last_price = pos.get('last_price', pos['avg_price'])
-                pnl_from_close = (last_price - pos['avg_price']) * pos['quantity']
+        if trade_rolls[step] < 0.08:
+            if trade_is_new[step] and len(open_ids) < MAX_POSITIONS:
+                instrument = instruments[instrument_picks[step]]
+                if instrument['id'] not in open_ids:
+                    avg_price = max(5, entry_prices[step])
+                    open_ids.append(instrument['id'])
+                    open_strikes.append(instrument['strike'])
+                    open_is_call.append(instrument['type'] == 'CE')
+                    open_qty.append(quantity_picks[step])
+                    open_avg.append(avg_price)
+                    open_booked.append(0.0)
+                    open_last.append(avg_price)
+            elif not trade_is_new[step] and open_ids:
+                slot = int(close_picks[step] * len(open_ids))
+                pnl_from_close = (open_last[slot] - open_avg[slot]) * open_qty[slot]
+                for column in open_columns:
+                    column[slot] = column[-1]
+                    column.pop()
                 
                 # Add realized PNL to remaining open positions to simulate portfolio effect
-                if current_positions:
-                    for pid in current_positions:
-                        current_positions[pid]['booked_pnl'] += pnl_from_close / len(current_positions)
+                if open_ids:
+                    share = pnl_from_close / len(open_ids)
+                    open_booked[:] = [booked_pnl + share for booked_pnl in open_booked]
         
         total_portfolio_pnl = 0
+        # Same for every position in this snapshot
+        time_decay = max(0.1, 1.0 - step * SNAPSHOT_INTERVAL_SECONDS / (6.25 * 3600))
+        step_time_values, step_noise = time_values[step], price_noise[step]
         
-        # Insert snapshot first
-        cursor.execute("INSERT INTO snapshots (id, timestamp, total_pnl) VALUES (?, ?, ?)", (snapshot_id, current_time.isoformat(), 0)) # Placeholder PNL
-        
-        details_to_insert = []
-        for instrument_id, position in current_positions.items():
-            instrument = position['instrument']
-            time_decay = max(0.1, 1.0 - (current_time - start_time).total_seconds() / (6.25 * 3600))
-            time_value = random.uniform(8, 35) * time_decay
-            intrinsic = max(0, underlying_price - instrument['strike']) if instrument['type'] == 'CE' else max(0, instrument['strike'] - underlying_price)
-            last_price = max(0.5, intrinsic + time_value + random.uniform(-3, 3))
+        for slot, (instrument_id, strike, is_call, quantity, avg_price, booked_pnl) in enumerate(
+                zip(open_ids, open_strikes, open_is_call, open_qty, open_avg, open_booked)):
+            time_value = step_time_values[slot] * time_decay
+            intrinsic = max(0, underlying_price - strike) if is_call else max(0, strike - underlying_price)
+            last_price = max(0.5, intrinsic + time_value + step_noise[slot])
             
-            unbooked_pnl = (last_price - position['avg_price']) * position['quantity']
-            position['last_price'] = last_price
-            total_portfolio_pnl += unbooked_pnl + position['booked_pnl']
+            unbooked_pnl = (last_price - avg_price) * quantity
+            open_last[slot] = last_price
+            total_portfolio_pnl += unbooked_pnl + booked_pnl
             
-            details_to_insert.append((snapshot_id, instrument_id, position['quantity'], position['avg_price'], last_price, unbooked_pnl, position['booked_pnl'], underlying_price))
-        
-        # Update snapshot with correct total PNL
-        cursor.execute("UPDATE snapshots SET total_pnl = ? WHERE id = ?", (total_portfolio_pnl, snapshot_id))
+            details_buffer.append((snapshot_id, instrument_id, quantity, avg_price, last_price, unbooked_pnl, booked_pnl, underlying_price))
         
-        # Bulk insert position details
-        cursor.executemany("INSERT INTO position_details (snapshot_id, instrument_id, quantity, avg_price, last_price, unbooked_pnl, booked_pnl, underlying_price) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", details_to_insert)
+        # Positions are priced first, so the snapshot is written once with its final PNL
+        snapshots_buffer.append((snapshot_id, timestamps[step], total_portfolio_pnl))
         
         snapshot_id += 1
         snapshots_created += 1
-        current_time += timedelta(seconds=15)
-    
-    conn.commit()
+        
+        # Bulk insert snapshots and their position details for a batch of snapshots at a time
+        if snapshots_created % FLUSH_EVERY == 0:
+            bulk_insert(cursor, "snapshots", SNAPSHOT_COLUMNS, snapshots_buffer)
+            bulk_insert(cursor, "position_details", POSITION_DETAIL_COLUMNS, details_buffer)
+            snapshots_buffer.clear()
+            details_buffer.clear()
+    
+    bulk_insert(cursor, "snapshots", SNAPSHOT_COLUMNS, snapshots_buffer)
+    bulk_insert(cursor, "position_details", POSITION_DETAIL_COLUMNS, details_buffer)
+    cursor.execute("COMMIT")
+    image = conn.serialize()
     conn.close()
     
     print(f"Created {snapshots_created} snapshots")
     
-    compressed_path = data_folder / f"{db_filename}.gz"
-    with open(db_path, 'rb') as f_in, gzip.open(compressed_path, 'wb') as f_out:
-        f_out.writelines(f_in)
-    os.remove(db_path)
+    # Same archive format as the capture script: a zstd frame the API reads first
+    compressed_path = data_folder / f"{db_filename}.zst"
+    compressed_path.write_bytes(zstd.ZstdCompressor(level=ARCHIVE_COMPRESSION_LEVEL).compress(image))
     
     print(f"Compressed test data: {compressed_path}")
     print(f"\nTest data generated successfully!")